@@ -13,7 +13,8 @@ class PredictionHistory(db.Model):
     image_thumbnail = db.Column(db.LargeBinary, nullable=True)
     predicted_tag = db.Column(db.String(100), nullable=False)
     probability = db.Column(db.Float, nullable=True)
-    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Indexed because /history sorts and paginates by timestamp
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
 
     def __repr__(self):
         """
@@ -1,4 +1,6 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import argparse
 import os
 from dotenv import load_dotenv
@@ -20,6 +22,47 @@ if not PREDICTION_URL or not PREDICTION_KEY:
     print("Please create a .env file and add the variables there.")
     sys.exit(1)
 
+# Request headers, fixed for the lifetime of the process
+AZURE_HEADERS = {
+    "Prediction-Key": PREDICTION_KEY,
+    "Content-Type": "application/octet-stream" # Use 'application/octet-stream' for local files
+}
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# --- HTTP Sessions ---
+# Pooled sessions let consecutive requests reuse the same connection.
+# (connect, read) timeouts so a hung endpoint can't block forever
+HTTP_TIMEOUT = (3.05, 20)
+
+# Azure Custom Vision: same retry policy as the server uses for this endpoint.
+session = requests.Session()
+adapter = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=64,
+    max_retries=Retry(
+        total=3,
+        connect=2,
+        read=2,
+        backoff_factor=0.2,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'POST']),
+        raise_on_status=False
+    )
+)
+session.mount("https://", adapter)
+
+# Our /predict-text endpoint calls Azure OpenAI and writes a history row, so a
+# repeated POST means another paid completion and a duplicate row. Only retry
+# connection failures (nothing was sent yet), and wait long enough for the
+# server's own OpenAI timeout and retries to finish.
+TEXT_TIMEOUT = (3.05, 70)
+text_session = requests.Session()
+text_adapter = HTTPAdapter(
+    max_retries=Retry(total=2, connect=2, read=False, status=0, backoff_factor=0.2)
+)
+text_session.mount("https://", text_adapter)
+text_session.mount("http://", text_adapter)
+
 def predict_local_image(image_path):
     """
     Sends a local image file to the Azure Custom Vision prediction endpoint.
@@ -27,15 +70,10 @@ def predict_local_image(image_path):
     try:
         # Read the image file in binary mode
         with open(image_path, "rb") as image_data:
-            headers = {
-                "Prediction-Key": PREDICTION_KEY,
-                "Content-Type": "application/octet-stream" # Use 'application/octet-stream' for local files
-            }
-            
             print(f"Sending request to {PREDICTION_URL}...")
             
             # Make the POST request
-            response = requests.post(PREDICTION_URL, headers=headers, data=image_data)
+            response = session.post(PREDICTION_URL, headers=AZURE_HEADERS, data=image_data, timeout=HTTP_TIMEOUT)
             
             # Raise an exception for bad status codes (4xx or 5xx)
             response.raise_for_status()
@@ -74,12 +112,11 @@ def predict_from_text(description):
     base_url = RENDER_BACKEND_URL or "http://127.0.0.1:5000"
     url = f"{base_url}/predict-text"
 
-    headers = {"Content-Type": "application/json"}
     payload = {"description": description}
 
     try:
         print(f"Sending text prediction request to: {url}")
-        response = requests.post(url, headers=headers, json=payload)
+        response = text_session.post(url, headers=JSON_HEADERS, json=payload, timeout=TEXT_TIMEOUT)
         response.raise_for_status()
 
         print("Request successful!")
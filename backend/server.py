@@ -4,16 +4,44 @@ import requests
 import logging
 import uuid
 import openai
-import json
+import orjson
+import hashlib
+import threading
+import atexit
+import queue
+import time
+from datetime import datetime, timezone
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
 from io import BytesIO
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, make_response
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from dotenv import load_dotenv
 from extensions import db
-from PIL import Image
+from sqlalchemy import insert
+from sqlalchemy.orm import load_only
+from PIL import Image, ImageOps, features
+
+# --- JSON Serialization ---
+class ORJSONProvider(DefaultJSONProvider):
+    """
+    Serializes Flask JSON responses (jsonify) with orjson, which is much faster
+    than the standard library and handles datetimes natively. Naive datetimes
+    are treated as UTC, matching the utcnow timestamps stored in the database.
+    """
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NAIVE_UTC).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
 # --- Initialization ---
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 CORS(app)  # Enable CORS for all routes
 load_dotenv()
 
@@ -24,6 +52,24 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL or 'sqlite:///' + os.path.join(os.path.abspath(os.path.dirname(__file__)), 'history.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False  # Optional: to suppress a warning
 
+# Size the connection pool explicitly so concurrent requests don't queue on the
+# default 5 connections, and drop stale connections before they're handed out.
+if DATABASE_URL:
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_timeout': 30,
+        'pool_recycle': 1800,
+        'pool_pre_ping': True
+    }
+else:
+    # SQLite: let pooled connections be used from Flask's worker threads. Each
+    # thread still checks out its own connection, so one thread's rollback
+    # can't discard another thread's uncommitted writes.
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'connect_args': {'check_same_thread': False}
+    }
+
 # Connect the SQLAlchemy object to the Flask app
 db.init_app(app)
 
@@ -41,10 +87,19 @@ AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 AZURE_OPENAI_KEY = os.getenv("AZURE_OPENAI_KEY")
 AZURE_OPENAI_DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
 
+# (connect, read) timeouts for outbound calls so a hung endpoint can't pin a worker thread
+HTTP_TIMEOUT = (3.05, 20)
+
 if not all([PREDICTION_URL, PREDICTION_KEY]):
     logging.error("FATAL: PREDICTION_URL and PREDICTION_KEY must be set in environment.")
     sys.exit(1)
 
+# Request headers for Azure Custom Vision, fixed for the lifetime of the process
+AZURE_HEADERS = {
+    "Prediction-Key": PREDICTION_KEY,
+    "Content-Type": "application/octet-stream"
+}
+
 if not all([AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_KEY, AZURE_OPENAI_DEPLOYMENT_NAME]):
     logging.warning("Azure OpenAI environment variables are not fully set. The /predict-text endpoint will not work.")
     openai_client = None
@@ -52,12 +107,243 @@ else:
     openai_client = openai.AzureOpenAI(
         azure_endpoint=AZURE_OPENAI_ENDPOINT,
         api_key=AZURE_OPENAI_KEY,
-        api_version="2024-02-01" # A recent, stable API version
+        api_version="2024-02-01", # A recent, stable API version
+        timeout=HTTP_TIMEOUT[1],
+        max_retries=2
+    )
+
+# --- Text Prediction Prompt ---
+# This is the "System Prompt" that instructs the AI on how to behave. It's built
+# once at startup; response_format in predict_text already enforces JSON output.
+SYSTEM_PROMPT = (
+    "You are a waste sorting assistant for New York City. Classify the item the user describes as "
+    "'recyclable', 'compostable', or 'landfill' and give it a simple, common name. "
+    "Reply with a JSON object containing 'category' and 'item', "
+    "e.g. {\"category\": \"recyclable\", \"item\": \"plastic bottle\"}"
+)
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+
+# --- Text Prediction Cache ---
+# Bump this whenever SYSTEM_PROMPT changes so stale classifications cached
+# under the old prompt are no longer served.
+SYSTEM_PROMPT_VERSION = 2
+TEXT_PREDICTION_CACHE = TTLCache(maxsize=10_000, ttl=86400)
+text_prediction_cache_lock = threading.Lock()
+
+def text_cache_key(description):
+    """
+    Builds the cache key for a text description, normalized so trivial
+    differences in case or surrounding whitespace share one entry.
+    """
+    raw_key = f"{AZURE_OPENAI_DEPLOYMENT_NAME}|{SYSTEM_PROMPT_VERSION}|{description.strip().lower()}"
+    return hashlib.blake2b(raw_key.encode()).hexdigest()
+
+# --- Image Prediction Cache ---
+# Maps a hash of the uploaded image bytes to (Azure results, thumbnail bytes).
+PREDICTION_CACHE = TTLCache(maxsize=5000, ttl=3600)
+prediction_cache_lock = threading.Lock()
+
+# --- HTTP Session ---
+# Reuse a pooled session so repeated calls to Azure Custom Vision keep the
+# TCP/TLS connection alive instead of handshaking on every request.
+AZURE_MAX_CONCURRENCY = 64  # concurrent Azure requests per worker process
+session = requests.Session()
+adapter = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=AZURE_MAX_CONCURRENCY,
+    # Retry transient failures with exponential backoff. Prediction POSTs are safe
+    # to repeat, and raise_on_status=False hands the last error response back to
+    # raise_for_status() once retries run out.
+    max_retries=Retry(
+        total=3,
+        connect=2,
+        read=2,
+        backoff_factor=0.2,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'POST']),
+        raise_on_status=False
     )
+)
+session.mount("https://", adapter)
+
+def request_prediction(image_data):
+    """
+    Sends image bytes to Azure Custom Vision and
+    returns the parsed prediction results.
+    """
+    # Make the POST request to Azure Custom Vision
+    logging.info("Sending prediction request to Azure...")
+    response = session.post(PREDICTION_URL, headers=AZURE_HEADERS, data=image_data, timeout=HTTP_TIMEOUT)
+    response.raise_for_status()  # Raise an exception for bad status codes
+    return response.json()
 
 if not DATABASE_URL:
     logging.warning("DATABASE_URL not set, falling back to local SQLite database.")
 
+# Thumbnailing is the only CPU-heavy work here; the official Pillow wheels
+# decode JPEGs with libjpeg-turbo, but source builds may link plain libjpeg.
+if not features.check_feature('libjpeg_turbo'):
+    logging.warning("Pillow is not using libjpeg-turbo; JPEG decoding will be slower.")
+
+# --- Background Persistence ---
+# Thumbnailing and database writes run off the request thread so the client
+# gets its prediction back without waiting on Pillow or the database.
+# The executor makes thumbnails; rows are written by history_writer below.
+executor = ThreadPoolExecutor(max_workers=4)
+
+def encode_thumbnail(img):
+    """
+    Shrinks an open Pillow image in place to a thumbnail (max 256x256 pixels)
+    and returns it encoded as a compressed JPEG.
+    """
+    img.thumbnail((256, 256), Image.Resampling.BILINEAR, reducing_gap=3.0)
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')  # JPEG has no alpha channel or palette
+
+    # Save the thumbnail to an in-memory buffer (4:2:0 subsampling, no extra optimize pass)
+    thumb_io = BytesIO()
+    img.save(thumb_io, 'JPEG', quality=85, optimize=False, progressive=False, subsampling=2)
+    return thumb_io.getvalue()
+
+def make_thumbnail(image_data):
+    """
+    Creates a compressed JPEG thumbnail (max 256x256 pixels) from raw image bytes.
+    """
+    img = Image.open(BytesIO(image_data))
+    # Let libjpeg decode at a reduced scale instead of the full-resolution photo
+    img.draft('RGB', (256, 256))
+    return encode_thumbnail(img)
+
+# Uploads larger than this are downscaled before being sent to Azure, which
+# resizes images to well under 1024 pixels internally anyway.
+LARGE_UPLOAD_BYTES = 1_500_000
+
+def downscale_upload(image_data):
+    """
+    Re-encodes a large upload at max 1024x1024 pixels for prediction.
+    Returns (prediction image bytes, thumbnail bytes) from a single decode.
+    """
+    img = Image.open(BytesIO(image_data))
+    img.draft('RGB', (1024, 1024))
+    # Re-encoding drops EXIF, so bake the camera orientation into the pixels
+    img = ImageOps.exif_transpose(img)
+    img.thumbnail((1024, 1024), Image.Resampling.BILINEAR)
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+
+    out = BytesIO()
+    img.save(out, 'JPEG', quality=88, subsampling=2)
+    return out.getvalue(), encode_thumbnail(img)
+
+def persist_prediction(tag, probability, image_data=None, thumbnail_data=None, image_hash=None):
+    """
+    Queues a prediction to be saved to the history table. Runs on the background executor.
+    If only the raw image is given, the thumbnail is generated here and stored
+    back into the image prediction cache under image_hash. If the thumbnail
+    can't be made, the prediction is still saved without one.
+    """
+    try:
+        if thumbnail_data is None and image_data is not None:
+            thumbnail_data = make_thumbnail(image_data)
+            if image_hash is not None:
+                with prediction_cache_lock:
+                    cached = PREDICTION_CACHE.get(image_hash)
+                    if cached is not None:
+                        PREDICTION_CACHE[image_hash] = (cached[0], thumbnail_data)
+    except Exception as e:
+        logging.error(f"Failed to create thumbnail for prediction '{tag}', saving it without one: {str(e)}")
+        thumbnail_data = None
+
+    queue_history(tag, probability, thumbnail_data)
+
+# --- Batched History Writes ---
+# A single writer thread collects queued history rows and inserts them in
+# batches, committing once per batch instead of once per prediction.
+HISTORY_BATCH_SIZE = 32
+HISTORY_BATCH_WAIT = 0.05  # seconds to wait for more rows before flushing
+history_queue = queue.Queue()
+
+def queue_history(tag, probability, thumbnail_data=None):
+    """
+    Queues a history row for the writer thread. Rows without a tag would
+    violate the NOT NULL constraint, so they're logged and dropped here.
+    """
+    if not tag:
+        logging.error("Not saving prediction to database: it has no predicted tag.")
+        return
+
+    history_queue.put({
+        "image_thumbnail": thumbnail_data,
+        "predicted_tag": tag,
+        "probability": probability
+    })
+
+def flush_history(items):
+    """
+    Inserts a batch of queued history rows with a single commit. If the batch
+    fails, the rows are retried one at a time so a single bad row can't take
+    the rest of the batch down with it.
+    """
+    with app.app_context():
+        try:
+            db.session.execute(insert(PredictionHistory), items)
+            db.session.commit()
+            logging.info(f"Successfully saved {len(items)} prediction(s) to database.")
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Failed to save {len(items)} prediction(s) as a batch, retrying individually: {str(e)}")
+            for item in items:
+                try:
+                    db.session.execute(insert(PredictionHistory), [item])
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    logging.error(f"Failed to save prediction '{item['predicted_tag']}' to database: {str(e)}")
+        finally:
+            db.session.remove()
+
+def history_writer():
+    """
+    Drains history_queue, flushing when a batch fills up or HISTORY_BATCH_WAIT
+    has passed since the first row of the batch arrived. Returns after flushing
+    everything queued before HISTORY_STOP.
+    """
+    items = []
+    deadline = None
+    while True:
+        timeout = None if deadline is None else max(0, deadline - time.monotonic())
+        try:
+            item = history_queue.get(timeout=timeout)
+            if item is HISTORY_STOP:
+                if items:
+                    flush_history(items)
+                return
+            items.append(item)
+            if deadline is None:
+                deadline = time.monotonic() + HISTORY_BATCH_WAIT
+        except queue.Empty:
+            pass
+
+        if items and (len(items) >= HISTORY_BATCH_SIZE or time.monotonic() >= deadline):
+            flush_history(items)
+            items = []
+            deadline = None
+
+# Queued to tell history_writer to flush what's left and exit
+HISTORY_STOP = object()
+history_writer_thread = threading.Thread(target=history_writer, name="history-writer", daemon=True)
+history_writer_thread.start()
+
+@atexit.register
+def stop_history_writer():
+    """
+    Flushes queued history rows on shutdown (e.g. a Gunicorn worker restart).
+    The executor's worker threads are joined before atexit hooks run, so every
+    pending thumbnail has been queued by the time the stop marker goes in.
+    """
+    history_queue.put(HISTORY_STOP)
+    history_writer_thread.join(timeout=10)
+
 @app.route("/")
 def health_check():
     """
@@ -65,6 +351,71 @@ def health_check():
     """
     return jsonify({"status": "ok"}), 200
 
+def classify_upload(file):
+    """
+    Returns the Azure prediction results for an uploaded image file and queues
+    its history record. Identical uploads are served from the prediction cache.
+    """
+    # Read image data into memory once; the same bytes are hashed, sent to
+    # Azure and used for the thumbnail
+    image_data = file.read()
+
+    # Identical uploads (retakes, client retries) reuse the earlier Azure result
+    image_hash = hashlib.blake2b(image_data, digest_size=16).hexdigest()
+    with prediction_cache_lock:
+        cached = PREDICTION_CACHE.get(image_hash)
+
+    if cached is not None:
+        logging.info(f"Cache hit for image {image_hash}, skipping Azure request.")
+        results, thumbnail_data = cached
+    else:
+        if len(image_data) > LARGE_UPLOAD_BYTES:
+            # Shrink large photos before uploading them; the thumbnail comes from the same decode
+            logging.info(f"Downscaling {len(image_data)} byte upload before prediction.")
+            upload_data, thumbnail_data = downscale_upload(image_data)
+            results = request_prediction(upload_data)
+        else:
+            # The thumbnail is filled in by the background worker once it's made
+            results = request_prediction(image_data)
+            thumbnail_data = None
+
+        with prediction_cache_lock:
+            PREDICTION_CACHE[image_hash] = (results, thumbnail_data)
+
+    # Find the prediction with the highest probability
+    predictions = results.get("predictions") or ()
+    if predictions:
+        top_prediction = max(predictions, key=itemgetter("probability"))
+        tag = top_prediction.get("tagName")
+        probability = top_prediction.get("probability")
+
+        # Save the history record (and thumbnail) in the background. The raw
+        # bytes are only needed when the thumbnail still has to be made.
+        executor.submit(
+            persist_prediction,
+            tag,
+            probability,
+            image_data=image_data if thumbnail_data is None else None,
+            thumbnail_data=thumbnail_data,
+            image_hash=image_hash
+        )
+
+    return results
+
+def prediction_error(e):
+    """
+    Logs a failed image prediction and returns (error body, HTTP status code).
+    """
+    if isinstance(e, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        # Read timeouts that exhaust the retries surface as a ConnectionError
+        logging.error(f"Azure Custom Vision did not respond: {str(e)}")
+        return {"error": "The prediction service did not respond. Please try again."}, 504
+    if isinstance(e, requests.exceptions.HTTPError):
+        logging.error(f"HTTP error occurred: {e.response.status_code} - {e.response.text}")
+        return {"error": f"HTTP error: {e.response.status_code}", "details": e.response.text}, 500
+    logging.error(f"An unexpected error occurred: {str(e)}")
+    return {"error": "An unexpected error occurred", "details": str(e)}, 500
+
 @app.route("/predict", methods=["POST"])
 def predict():
     """
@@ -79,58 +430,46 @@ def predict():
         return jsonify({"error": "No image selected for uploading"}), 400
 
     try:
-        # Read image data into memory for prediction
-        image_data = file.read()
-
-        headers = {
-            "Prediction-Key": PREDICTION_KEY,
-            "Content-Type": "application/octet-stream"
-        }
-
-        # Make the POST request to Azure Custom Vision
-        logging.info("Sending prediction request to Azure...")
-        response = requests.post(PREDICTION_URL, headers=headers, data=image_data)
-        response.raise_for_status()  # Raise an exception for bad status codes
-
-        # --- 2. Process the response and save to database ---
-        results = response.json()
-        
-        # Find the prediction with the highest probability
-        if results.get("predictions"):
-            top_prediction = max(results["predictions"], key=lambda p: p["probability"])
-            tag = top_prediction.get("tagName")
-            probability = top_prediction.get("probability")
-
-            # --- Create and save a compressed thumbnail ---
-            # Rewind the stream and open with Pillow
-            file.seek(0)
-            img = Image.open(file)
-            img.thumbnail((256, 256)) # Create a thumbnail (max 256x256 pixels)
-            
-            # Save the thumbnail to an in-memory buffer
-            thumb_io = BytesIO()
-            img.save(thumb_io, 'JPEG', quality=85)
-            thumbnail_data = thumb_io.getvalue()
-
-            # Create a new history record
-            new_history_entry = PredictionHistory(
-                image_thumbnail=thumbnail_data,
-                predicted_tag=tag,
-                probability=probability
-            )
-            db.session.add(new_history_entry)
-            db.session.commit()
-            logging.info(f"Successfully saved prediction and compressed thumbnail to database.")
+        results = classify_upload(file)
 
         # Return the JSON response from Azure to the mobile app
         return jsonify(results)
 
-    except requests.exceptions.HTTPError as e:
-        logging.error(f"HTTP error occurred: {e.response.status_code} - {e.response.text}")
-        return jsonify({"error": f"HTTP error: {e.response.status_code}", "details": e.response.text}), 500
     except Exception as e:
-        logging.error(f"An unexpected error occurred: {str(e)}")
-        return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
+        error, status = prediction_error(e)
+        return jsonify(error), status
+
+# Maximum number of images accepted by a single /predict-batch request
+MAX_BATCH_FILES = 16
+
+# /predict-batch classifies its images on this pool so the Azure round-trips
+# overlap instead of running one after another.
+azure_executor = ThreadPoolExecutor(max_workers=AZURE_MAX_CONCURRENCY)
+
+@app.route("/predict-batch", methods=["POST"])
+def predict_batch():
+    """
+    Receives several image files (multipart field 'files') and returns a list
+    of Azure predictions in the same order. The images are classified
+    concurrently; a failed image gets an error object in its slot.
+    """
+    files = [file for file in request.files.getlist('files') if file.filename != '']
+    if not files:
+        return jsonify({"error": "No images selected for uploading"}), 400
+    if len(files) > MAX_BATCH_FILES:
+        return jsonify({"error": f"At most {MAX_BATCH_FILES} images can be sent in one request"}), 400
+
+    futures = [azure_executor.submit(classify_upload, file) for file in files]
+
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            error, _ = prediction_error(e)
+            results.append(error)
+
+    return jsonify(results)
 
 @app.route("/predict-text", methods=["POST"])
 def predict_text():
@@ -147,63 +486,89 @@ def predict_text():
     user_description = data['description']
     logging.info(f"Received text prediction request for: '{user_description}'")
 
-    # This is the "System Prompt" that instructs the AI on how to behave.
-    system_prompt = (
-        "You are an expert waste sorting assistant for New York City. Based on the user's description of an item, "
-        "determine if it is 'recyclable', 'compostable', or 'landfill'. "
-        "Also, provide a simple, common name for the item. "
-        "Respond ONLY with a valid JSON object containing 'category' and 'item'. "
-        "Example: {\"category\": \"recyclable\", \"item\": \"plastic bottle\"}"
-    )
-
     try:
-        response = openai_client.chat.completions.create(
-            model=AZURE_OPENAI_DEPLOYMENT_NAME,
-            response_format={"type": "json_object"}, # Enforce JSON output
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_description}
-            ]
-        )
+        # Serve repeated descriptions from the cache instead of calling the AI again
+        cache_key = text_cache_key(user_description)
+        with text_prediction_cache_lock:
+            result_data = TEXT_PREDICTION_CACHE.get(cache_key)
+
+        if result_data is not None:
+            logging.info(f"Cache hit for text prediction: '{user_description}'")
+        else:
+            response = openai_client.chat.completions.create(
+                model=AZURE_OPENAI_DEPLOYMENT_NAME,
+                response_format={"type": "json_object"}, # Enforce JSON output
+                messages=[
+                    SYSTEM_MESSAGE,
+                    {"role": "user", "content": user_description}
+                ]
+            )
+
+            # Extract the JSON string from the response
+            result_json_string = response.choices[0].message.content
+            logging.info(f"Received from OpenAI: {result_json_string}")
+
+            # Parse the JSON string into a Python dictionary
+            result_data = orjson.loads(result_json_string)
 
-        # Extract the JSON string from the response
-        result_json_string = response.choices[0].message.content
-        logging.info(f"Received from OpenAI: {result_json_string}")
+            # Only well-formed replies are cached; anything else would be served for a day
+            if not (isinstance(result_data, dict) and result_data.get('item') and result_data.get('category')):
+                logging.error(f"OpenAI response is missing 'item' or 'category': {result_json_string}")
+                return jsonify({"error": "AI returned an invalid format."}), 500
 
-        # Parse the JSON string into a Python dictionary
-        result_data = json.loads(result_json_string)
+            with text_prediction_cache_lock:
+                TEXT_PREDICTION_CACHE[cache_key] = result_data
 
         # --- Save the text prediction to the database ---
         # We don't have an image, so image_thumbnail will be None.
         # We don't have a probability score, so probability will be None.
-        text_history_entry = PredictionHistory(
-            image_thumbnail=None,
-            predicted_tag=result_data.get('item'),
-            probability=None  # OpenAI does not provide a confidence score
-        )
-        db.session.add(text_history_entry)
-        db.session.commit()
-        logging.info(f"Successfully saved text prediction to database.")
-
+        queue_history(result_data.get('item'), None)  # OpenAI does not provide a confidence score
 
         # The result_data should be like {"category": "...", "item": "..."}
         return jsonify(result_data)
 
-    except json.JSONDecodeError:
+    except openai.APITimeoutError:
+        logging.error("Timed out waiting for Azure OpenAI.")
+        return jsonify({"error": "The AI service timed out. Please try again."}), 504
+    except orjson.JSONDecodeError:
         logging.error(f"Failed to decode JSON from OpenAI response: {result_json_string}")
         return jsonify({"error": "AI returned an invalid format."}), 500
     except Exception as e:
         logging.error(f"An error occurred with Azure OpenAI: {str(e)}")
         return jsonify({"error": "An error occurred while communicating with the AI service."}), 500
 
+# Maximum number of records returned by a single /history request
+HISTORY_PAGE_SIZE = 100
+
 @app.route("/history", methods=["GET"])
 def get_history():
     """
-    Retrieves the prediction history from the database.
+    Retrieves the prediction history from the database, newest first.
+    Returns at most HISTORY_PAGE_SIZE records; pass the timestamp of the last
+    record as the 'before' query parameter to fetch the next page.
     """
+    before = request.args.get('before')
+    if before:
+        try:
+            before = datetime.fromisoformat(before)
+        except ValueError:
+            return jsonify({"error": "'before' must be an ISO 8601 timestamp."}), 400
+        # Timestamps are stored as naive UTC; convert cursors that carry an offset
+        if before.tzinfo is not None:
+            before = before.astimezone(timezone.utc).replace(tzinfo=None)
+
     try:
-        # Query the database for all history records, ordered by the most recent first
-        history_records = PredictionHistory.query.order_by(PredictionHistory.timestamp.desc()).all()
+        # Query the database for history records, ordered by the most recent first
+        # Only load the columns we return, so thumbnail blobs are never fetched here
+        query = PredictionHistory.query.options(load_only(
+            PredictionHistory.id,
+            PredictionHistory.predicted_tag,
+            PredictionHistory.probability,
+            PredictionHistory.timestamp
+        ))
+        if before:
+            query = query.filter(PredictionHistory.timestamp < before)
+        history_records = query.order_by(PredictionHistory.timestamp.desc()).limit(HISTORY_PAGE_SIZE).all()
 
         # Convert the list of SQLAlchemy objects to a list of dictionaries
         history_list = []
@@ -212,7 +577,7 @@ def get_history():
                 "id": record.id,
                 "predicted_tag": record.predicted_tag,
                 "probability": record.probability,
-                "timestamp": record.timestamp.isoformat()  # Use ISO format for consistency
+                "timestamp": record.timestamp  # Serialized as ISO 8601 (UTC) by ORJSONProvider
             })
         return jsonify(history_list)
     except Exception as e:
@@ -223,18 +588,50 @@ def get_history():
 def get_history_image(record_id):
     """
     Retrieves a specific image thumbnail from the database by its ID.
+    Thumbnails never change once saved, so clients may cache them indefinitely.
     """
+    etag = f"w{record_id}"
+
     try:
-        # Find the specific history record by its primary key, or return 404
-        record = PredictionHistory.query.get_or_404(record_id)
+        # The client already has this thumbnail; confirm it still exists without loading the blob
+        if etag in request.if_none_match:
+            has_thumbnail = db.session.query(PredictionHistory.id).filter(
+                PredictionHistory.id == record_id,
+                PredictionHistory.image_thumbnail.isnot(None)
+            ).scalar()
+            if has_thumbnail is None:
+                return jsonify({"error": "Image not found"}), 404
+            response = make_response('', 304)
+        else:
+            # Find the specific history record by its primary key
+            record = db.session.get(PredictionHistory, record_id)
+            # Text predictions, and images whose thumbnail failed, have no image to send
+            if record is None or record.image_thumbnail is None:
+                return jsonify({"error": "Image not found"}), 404
+
+            # Use send_file to send the binary data with the correct MIME type.
+            # conditional=True also answers If-Modified-Since and Range requests.
+            response = send_file(
+                BytesIO(record.image_thumbnail),
+                mimetype='image/jpeg',
+                download_name=f'{record_id}.jpg',
+                etag=etag,
+                last_modified=record.timestamp,
+                conditional=True,
+                max_age=31536000
+            )
 
-        # Use send_file to send the binary data with the correct MIME type
-        return send_file(BytesIO(record.image_thumbnail), mimetype='image/jpeg')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
 
     except Exception as e:
         logging.error(f"An error occurred while fetching image {record_id}: {str(e)}")
         return jsonify({"error": "Failed to retrieve image", "details": str(e)}), 500
 
 if __name__ == "__main__":
+    # Local development only; production runs under Gunicorn (see startup.sh).
+    # Set FLASK_DEV=1 (or true/yes) to enable the debugger and auto-reloader.
+    debug = os.getenv("FLASK_DEV", "").lower() in ("1", "true", "yes")
     # Run the server on all available network interfaces
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    app.run(host="0.0.0.0", port=5000, debug=debug, threaded=True)
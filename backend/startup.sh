@@ -12,6 +12,15 @@ until python -c 'from server import app, db; app.app_context().push(); db.engine
 done
 echo "--- Database is ready. Creating tables (if they don't exist). ---"
 python -c 'from server import app, db; app.app_context().push(); db.create_all()'
+# create_all() skips tables that already exist, so add any indexes missing from older databases.
+python -c 'from server import app, db, PredictionHistory; app.app_context().push(); [index.create(db.engine, checkfirst=True) for index in PredictionHistory.__table__.indexes]'
 
 echo "--- Starting Gunicorn server ---"
-gunicorn server:app
\ No newline at end of file
+# Threaded workers let requests waiting on Azure overlap instead of queuing.
+# WEB_CONCURRENCY is set by Render; each worker has its own DB pool and caches.
+gunicorn server:app \
+  --worker-class gthread \
+  --workers "${WEB_CONCURRENCY:-2}" \
+  --threads 8 \
+  --timeout 60 \
+  --keep-alive 5